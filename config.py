@@ -0,0 +1,31 @@
+"""
+Environment Settings Helpers
+
+Validated readers for numeric environment variables. A typo raises a
+ValueError naming the variable instead of failing somewhere less obvious.
+"""
+
+import os
+
+
+def _env_number(name: str, default, minimum, cast):
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number >= {minimum}, got {raw!r}") from None
+    if value < minimum:
+        raise ValueError(f"{name} must be a number >= {minimum}, got {raw!r}")
+    return value
+
+
+def env_int(name: str, default: int, minimum: int = 0) -> int:
+    """Read an integer setting that is at least `minimum`"""
+    return _env_number(name, default, minimum, int)
+
+
+def env_float(name: str, default: float, minimum: float = 0.0) -> float:
+    """Read a float setting that is at least `minimum`"""
+    return _env_number(name, default, minimum, float)
@@ -0,0 +1,17 @@
+import mongomock
+import pytest
+
+import database
+import main
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Point main and database at a fresh in-memory Mongo"""
+    mdb = mongomock.MongoClient()["test"]
+    monkeypatch.setattr(database, "db", mdb)
+    monkeypatch.setattr(main, "db", mdb)
+    monkeypatch.setattr(main, "_settings_cache", {"value": None, "ts": 0.0, "version": 0})
+    database._col.cache_clear()
+    yield mdb
+    database._col.cache_clear()
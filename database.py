@@ -6,15 +6,23 @@ Import and use these functions in your API endpoints for database operations.
 """
 
 from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, PyMongoError
 from datetime import datetime, timezone
+from functools import lru_cache
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Union
 from pydantic import BaseModel
+from config import env_int
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
 
@@ -22,42 +30,130 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    # Configure short timeouts to avoid blocking startup if Mongo is unreachable
-    _client = MongoClient(
-        database_url,
+    # Configure short timeouts to avoid blocking startup if Mongo is unreachable.
+    # Each uvicorn worker holds its own pool, so keep
+    # MONGO_MAX_POOL x workers below the server's connection limit
+    # (net.maxIncomingConnections); past that, a bigger pool only adds queueing.
+    # 0 would mean "unlimited" to pymongo, so require an explicit bound
+    max_pool = env_int("MONGO_MAX_POOL", 20, minimum=1)
+    min_pool = env_int("MONGO_MIN_POOL", min(5, max_pool))
+    if min_pool > max_pool:
+        raise ValueError(
+            f"MONGO_MIN_POOL ({min_pool}) must not exceed MONGO_MAX_POOL ({max_pool})"
+        )
+    client_options = dict(
         serverSelectionTimeoutMS=500,
         connectTimeoutMS=500,
         socketTimeoutMS=500,
         retryWrites=True,
+        maxPoolSize=max_pool,
+        minPoolSize=min_pool,
+        waitQueueTimeoutMS=2000,
+        maxIdleTimeMS=60000,
     )
+    # Wire compression is opt-in, e.g. MONGO_COMPRESSORS=zstd,snappy (needs the
+    # zstandard/python-snappy packages); it is only used if the server agrees.
+    compressors = os.getenv("MONGO_COMPRESSORS")
+    if compressors:
+        client_options["compressors"] = compressors
+    _client = MongoClient(database_url, **client_options)
     # Don't call server_info() here to keep startup non-blocking
     db = _client[database_name]
 
 # Helper functions for common database operations
 
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+@lru_cache(maxsize=None)
+def _col(collection_name: str):
+    """Return a cached collection handle"""
+    return db[collection_name]
+
+def create_document(collection_name: str, data: Union[BaseModel, dict], _copy: bool = True):
+    """Insert a single document with timestamp
+
+    Internal callers that build a throwaway dict can pass _copy=False to
+    skip the defensive copy; the dict is then stamped and mutated in place.
+    """
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
-    else:
+    elif _copy:
         data_dict = data.copy()
+    else:
+        data_dict = data
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = datetime.now(timezone.utc)
+    data_dict['created_at'] = data_dict['updated_at'] = now
 
-    result = db[collection_name].insert_one(data_dict)
+    result = _col(collection_name).insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+def create_documents(collection_name: str, items: List[Union[BaseModel, dict]], _copy: bool = True):
+    """Insert many documents in one round trip; returns their ids in input order
+
+    Inserts are unordered, so on BulkWriteError the documents that did not
+    fail are still stored. With _copy=False the caller's dicts receive their
+    _id in place, which lets it tell which ones were written.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if not items:
+        return []
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in items:
+        if isinstance(data, BaseModel):
+            data_dict = data.model_dump()
+        elif _copy:
+            data_dict = data.copy()
+        else:
+            data_dict = data
+        data_dict['created_at'] = data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    result = _col(collection_name).insert_many(docs, ordered=False)
+    return [str(i) for i in result.inserted_ids]
+
+# Indexes the API relies on: (collection, keys, options). Product names are
+# unique; settings is a singleton keyed on _id, which is always indexed.
+_INDEXES = [
+    ("product", [("name", 1)], {"unique": True}),
+]
+
+def _create_indexes() -> bool:
+    """Try each index once; returns False if Mongo was unreachable"""
+    reachable = True
+    for collection_name, keys, options in _INDEXES:
+        try:
+            _col(collection_name).create_index(keys, **options)
+        except ConnectionFailure as e:
+            logger.warning("Could not create index %s on %s, will retry: %s", keys, collection_name, e)
+            reachable = False
+        except PyMongoError as e:
+            # e.g. existing documents violate the unique constraint; retrying won't help
+            logger.error("Could not create index %s on %s: %s", keys, collection_name, e)
+    return reachable
+
+def ensure_indexes(retry_delay: float = 30.0):
+    """Create indexes in a background thread, retrying while Mongo is unreachable"""
+    if db is None:
+        return
+
+    def run():
+        while not _create_indexes():
+            time.sleep(retry_delay)
+
+    threading.Thread(target=run, name="ensure-indexes", daemon=True).start()
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally returning only the projected fields"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = _col(collection_name).find(filter_dict or {}, projection)
     if limit:
         cursor = cursor.limit(limit)
     
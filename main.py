@@ -1,20 +1,42 @@
+import hashlib
 import os
-from fastapi import FastAPI, HTTPException
+import threading
+import time
+import orjson
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from dataclasses import dataclass
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from config import env_float
 try:
-    from database import db, create_document, get_documents
-except Exception:
-    # If database import triggers a connection error, provide safe fallbacks
+    from database import db, create_document, create_documents, ensure_indexes
+except (ImportError, PyMongoError):
+    # If database import triggers a connection error, provide safe fallbacks.
+    # Configuration mistakes (e.g. a malformed MONGO_MAX_POOL) still raise.
     db = None
+    def ensure_indexes(*args, **kwargs):
+        pass
     def create_document(*args, **kwargs):
         raise Exception("Database not available")
-    def get_documents(*args, **kwargs):
+    def create_documents(*args, **kwargs):
         raise Exception("Database not available")
 from bson import ObjectId
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Off the startup path: builds in the background and retries until Mongo is up
+    ensure_indexes()
+    yield
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,19 +45,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Product lists grow with the catalog; small payloads aren't worth compressing
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
-# Utility to convert Mongo docs to JSON-serializable
+# Mongo's _id -> API "id"; datetimes are left for the response encoder
 
-def serialize_doc(doc):
-    if not doc:
-        return doc
-    doc["id"] = str(doc.get("_id"))
-    doc.pop("_id", None)
-    # Convert datetimes to isoformat
-    for k, v in list(doc.items()):
-        import datetime
-        if isinstance(v, (datetime.datetime, datetime.date)):
-            doc[k] = v.isoformat()
+def _id_to_str(doc):
+    doc["id"] = str(doc.pop("_id"))
     return doc
 
 
@@ -63,6 +79,52 @@ class ProductOut(BaseModel):
     margin_percent: float
     ingredients: List[IngredientIn]
 
+@dataclass(slots=True)
+class ProductOutFast:
+    """Same shape as ProductOut, for building list responses without validation"""
+    id: str
+    name: str
+    category: Optional[str]
+    price: float
+    cost: float
+    margin_amount: float
+    margin_percent: float
+    ingredients: list
+
+def _opt_float(v):
+    return None if v is None else float(v)
+
+
+def _ingredient_out(ing: dict) -> dict:
+    # Stored ingredient -> exactly IngredientIn's keys and types, minus the
+    # validation pass; legacy rows may miss keys or hold ints
+    return {
+        "name": ing.get("name"),
+        "unit": ing.get("unit"),
+        "unit_cost": _opt_float(ing.get("unit_cost")),
+        "pack_size": _opt_float(ing.get("pack_size")),
+        "pack_cost": _opt_float(ing.get("pack_cost")),
+        "quantity": float(ing.get("quantity") or 0),
+    }
+
+# Only the fields ProductOut needs; keeps timestamps and any extras off the wire
+PRODUCT_LIST_PROJECTION = {"name": 1, "category": 1, "price": 1, "cost": 1, "ingredients": 1}
+
+# Margins are computed server-side (a missing price counts as 0, as in
+# Python); documents without a stored cost are handled by list_products
+PRODUCT_LIST_PIPELINE = [
+    {"$project": PRODUCT_LIST_PROJECTION},
+    {"$addFields": {"price": {"$ifNull": ["$price", 0]}}},
+    {"$addFields": {
+        "margin_amount": {"$subtract": ["$price", "$cost"]},
+        "margin_percent": {"$cond": [
+            {"$eq": ["$price", 0]},
+            0,
+            {"$multiply": [{"$divide": [{"$subtract": ["$price", "$cost"]}, "$price"]}, 100]},
+        ]},
+    }},
+]
+
 class SettingsIn(BaseModel):
     tax_rate: float
 
@@ -80,100 +142,199 @@ def effective_unit_cost(ing: IngredientIn) -> float:
 
 
 def compute_cost(ingredients: List[IngredientIn]) -> float:
-    return float(sum(effective_unit_cost(i) * (i.quantity or 0) for i in ingredients))
+    # Plain accumulation loop: ingredient lists are short, so this beats
+    # building a generator (or NumPy arrays) per call. Zero-quantity lines
+    # contribute nothing and skip the unit-cost lookup entirely.
+    total = 0.0
+    for i in ingredients:
+        if i.quantity:
+            total += effective_unit_cost(i) * i.quantity
+    return total
+
+
+def _build_sample_products() -> List[ProductOut]:
+    # stateless default sample list demonstrating package-based costing too
+    sample = [
+        {
+            "name": "Espresso",
+            "category": "Coffee",
+            "price": 3.0,
+            "ingredients": [
+                {"name": "Coffee Beans", "unit": "g", "pack_size": 1000, "pack_cost": 38, "quantity": 18},
+                {"name": "Cup", "unit": "pc", "unit_cost": 0.12, "quantity": 1},
+            ],
+        },
+        {
+            "name": "Latte 12oz",
+            "category": "Coffee",
+            "price": 4.5,
+            "ingredients": [
+                {"name": "Coffee Beans", "unit": "g", "pack_size": 1000, "pack_cost": 38, "quantity": 18},
+                {"name": "Milk", "unit": "ml", "pack_size": 1000, "pack_cost": 1.0, "quantity": 220},
+                {"name": "Cup", "unit": "pc", "unit_cost": 0.12, "quantity": 1},
+            ],
+        },
+    ]
+    result = []
+    for i, x in enumerate(sample):
+        ings = [IngredientIn(**ing) for ing in x.get("ingredients", [])]
+        cost = compute_cost(ings)
+        price = float(x.get("price", 0))
+        margin_amount = price - cost
+        margin_percent = (margin_amount / price * 100) if price else 0
+        result.append(
+            ProductOut(
+                id=str(i),
+                name=x["name"],
+                category=x.get("category"),
+                price=price,
+                cost=cost,
+                margin_amount=margin_amount,
+                margin_percent=margin_percent,
+                ingredients=ings,
+            )
+        )
+    return result
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison: gzip-ing proxies rewrite our tag as W/"..."
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+# Responses served when no DB is configured; they never change
+_SAMPLE_PRODUCTS_JSON = orjson.dumps([p.model_dump() for p in _build_sample_products()])
+_SAMPLE_SETTINGS_JSON = orjson.dumps(SettingsOut(tax_rate=0.1).model_dump())
+_SAMPLE_SETTINGS_ETAG = _etag(_SAMPLE_SETTINGS_JSON)
 
 
+# Endpoints that talk to Mongo stay sync so FastAPI runs the blocking
+# pymongo calls in its threadpool; I/O-free routes run on the event loop.
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Coffee Shop Backend Running"}
 
 
-@app.get("/api/settings", response_model=SettingsOut)
-def get_settings():
-    if db is None:
-        # Provide default if no DB configured
-        return SettingsOut(tax_rate=0.1)
+# Settings change rarely; serve them from memory for a few seconds. Keep the
+# TTL short when running several workers, since each holds its own copy.
+SETTINGS_CACHE_TTL = env_float("SETTINGS_CACHE_TTL", 5.0)
+# value is the rendered (body, etag) pair, swapped as one object. version is
+# bumped by every PUT so a GET that read the DB before the write cannot store
+# its stale result afterwards
+_settings_cache = {"value": None, "ts": 0.0, "version": 0}
+_settings_lock = threading.Lock()
+
+
+# Settings is a singleton document. New deployments create it with a fixed
+# _id so two concurrent first writes collide on the _id index instead of
+# inserting two documents; older deployments keep whatever _id they have.
+SETTINGS_ID = "global"
+
+
+def _upsert_settings(update: dict):
+    """Atomically update (or create) the settings document and return it"""
+    try:
+        return db["settings"].find_one_and_update(
+            {}, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another request created the singleton first; it exists now
+        return db["settings"].find_one_and_update(
+            {}, update, return_document=ReturnDocument.AFTER
+        )
+
+
+def _render_settings(out: SettingsOut):
+    body = orjson.dumps(out.model_dump())
+    return body, _etag(body)
+
+
+def _load_settings():
+    """Return the (body, etag) of the current settings, cached for the TTL"""
+    now = time.monotonic()
+    if _settings_cache["value"] is not None and now - _settings_cache["ts"] < SETTINGS_CACHE_TTL:
+        return _settings_cache["value"]
+    version = _settings_cache["version"]
     doc = db["settings"].find_one({})
     if not doc:
         # default create
-        create_document("settings", {"tax_rate": 0.1})
-        doc = db["settings"].find_one({})
-    s = serialize_doc(doc)
-    return SettingsOut(id=s.get("id"), tax_rate=s.get("tax_rate", 0.1))
+        now_utc = datetime.now(timezone.utc)
+        doc = _upsert_settings({"$setOnInsert": {
+            "_id": SETTINGS_ID, "tax_rate": 0.1, "created_at": now_utc, "updated_at": now_utc,
+        }})
+    s = _id_to_str(doc)
+    rendered = _render_settings(SettingsOut(id=s.get("id"), tax_rate=s.get("tax_rate", 0.1)))
+    with _settings_lock:
+        if _settings_cache["version"] == version:
+            _settings_cache["value"] = rendered
+            _settings_cache["ts"] = now
+    return rendered
+
+
+@app.get("/api/settings", response_model=SettingsOut)
+def get_settings(request: Request):
+    if db is None:
+        # Provide default if no DB configured
+        body, etag = _SAMPLE_SETTINGS_JSON, _SAMPLE_SETTINGS_ETAG
+    else:
+        body, etag = _load_settings()
+    # no-cache lets clients keep the body but revalidate every time, so a PUT
+    # is visible immediately; unchanged settings cost a bodiless 304
+    headers = {"Cache-Control": "no-cache", "ETag": etag}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.put("/api/settings", response_model=SettingsOut)
 def update_settings(payload: SettingsIn):
     if db is None:
         return SettingsOut(tax_rate=payload.tax_rate)
-    existing = db["settings"].find_one({})
-    if existing:
-        db["settings"].update_one({"_id": existing["_id"]}, {"$set": {"tax_rate": payload.tax_rate}})
-        doc = db["settings"].find_one({"_id": existing["_id"]})
-    else:
-        create_document("settings", {"tax_rate": payload.tax_rate})
-        doc = db["settings"].find_one({})
-    s = serialize_doc(doc)
-    return SettingsOut(id=s.get("id"), tax_rate=s.get("tax_rate", 0.1))
+    now_utc = datetime.now(timezone.utc)
+    doc = _upsert_settings({
+        "$set": {"tax_rate": payload.tax_rate, "updated_at": now_utc},
+        "$setOnInsert": {"_id": SETTINGS_ID, "created_at": now_utc},
+    })
+    out = SettingsOut(id=str(doc["_id"]), tax_rate=payload.tax_rate)
+    rendered = _render_settings(out)
+    with _settings_lock:
+        _settings_cache["version"] += 1
+        _settings_cache["value"] = rendered
+        _settings_cache["ts"] = time.monotonic()
+    return out
 
 
 @app.get("/api/products", response_model=List[ProductOut])
 def list_products():
     if db is None:
-        # stateless default sample list demonstrating package-based costing too
-        sample = [
-            {
-                "name": "Espresso",
-                "category": "Coffee",
-                "price": 3.0,
-                "ingredients": [
-                    {"name": "Coffee Beans", "unit": "g", "pack_size": 1000, "pack_cost": 38, "quantity": 18},
-                    {"name": "Cup", "unit": "pc", "unit_cost": 0.12, "quantity": 1},
-                ],
-            },
-            {
-                "name": "Latte 12oz",
-                "category": "Coffee",
-                "price": 4.5,
-                "ingredients": [
-                    {"name": "Coffee Beans", "unit": "g", "pack_size": 1000, "pack_cost": 38, "quantity": 18},
-                    {"name": "Milk", "unit": "ml", "pack_size": 1000, "pack_cost": 1.0, "quantity": 220},
-                    {"name": "Cup", "unit": "pc", "unit_cost": 0.12, "quantity": 1},
-                ],
-            },
-        ]
-        result = []
-        for i, x in enumerate(sample):
-            ings = [IngredientIn(**ing) for ing in x.get("ingredients", [])]
-            cost = compute_cost(ings)
-            price = float(x.get("price", 0))
-            margin_amount = price - cost
-            margin_percent = (margin_amount / price * 100) if price else 0
-            result.append(
-                ProductOut(
-                    id=str(i),
-                    name=x["name"],
-                    category=x.get("category"),
-                    price=price,
-                    cost=cost,
-                    margin_amount=margin_amount,
-                    margin_percent=margin_percent,
-                    ingredients=ings,
-                )
-            )
-        return result
+        # Demo mode: the sample list never changes, so it is rendered once at import
+        return Response(content=_SAMPLE_PRODUCTS_JSON, media_type="application/json")
 
-    items = get_documents("product")
+    items = db["product"].aggregate(PRODUCT_LIST_PIPELINE)
     result = []
     for d in items:
-        s = serialize_doc(d)
-        ings = [IngredientIn(**ing) for ing in s.get("ingredients", [])]
+        s = _id_to_str(d)
+        ings = [_ingredient_out(ing) for ing in s.get("ingredients", [])]
         price = float(s.get("price", 0))
-        cost = compute_cost(ings)
-        margin_amount = price - cost
-        margin_percent = (margin_amount / price * 100) if price else 0
+        if s.get("cost") is not None:
+            cost = float(s["cost"])
+            margin_amount = float(s["margin_amount"])
+            margin_percent = float(s["margin_percent"])
+        else:
+            # Documents that predate the stored cost
+            cost = compute_cost([IngredientIn.model_construct(**ing) for ing in ings])
+            margin_amount = price - cost
+            margin_percent = (margin_amount / price * 100) if price else 0
         result.append(
-            ProductOut(
+            ProductOutFast(
                 id=s["id"],
                 name=s.get("name"),
                 category=s.get("category"),
@@ -184,65 +345,114 @@ def list_products():
                 ingredients=ings,
             )
         )
-    return result
+    # orjson serializes the dataclasses directly; ProductOut still documents the shape
+    return ORJSONResponse(result)
 
 
-@app.post("/api/products", response_model=ProductOut)
-def create_product(payload: ProductIn):
-    ings = [IngredientIn(**ing.model_dump()) for ing in payload.ingredients]
-    cost = compute_cost(ings)
-    if db is None:
-        price = float(payload.price)
-        margin_amount = price - cost
-        margin_percent = (margin_amount / price * 100) if price else 0
-        return ProductOut(
-            id="temp",
-            name=payload.name,
-            category=payload.category,
-            price=price,
-            cost=cost,
-            margin_amount=margin_amount,
-            margin_percent=margin_percent,
-            ingredients=ings,
-        )
-    # Persist
-    to_insert = {
+def _product_doc(payload: ProductIn, cost: float) -> dict:
+    return {
         "name": payload.name,
         "category": payload.category,
         "price": float(payload.price),
-        "ingredients": [ing.model_dump() for ing in ings],
+        "ingredients": [ing.model_dump() for ing in payload.ingredients],
         # store cost as well for convenience
         "cost": cost,
     }
-    _id = create_document("product", to_insert)
-    d = db["product"].find_one({"_id": ObjectId(_id)})
-    s = serialize_doc(d)
-    ings_db = [IngredientIn(**ing) for ing in s.get("ingredients", [])]
-    price = float(s.get("price", 0))
-    cost = compute_cost(ings_db)
+
+
+def _product_out(_id: str, payload: ProductIn, cost: float) -> ProductOut:
+    # payload is already validated, so skip a second pass
+    price = float(payload.price)
     margin_amount = price - cost
     margin_percent = (margin_amount / price * 100) if price else 0
-    return ProductOut(
-        id=s["id"],
-        name=s.get("name"),
-        category=s.get("category"),
+    return ProductOut.model_construct(
+        id=_id,
+        name=payload.name,
+        category=payload.category,
         price=price,
         cost=cost,
         margin_amount=margin_amount,
         margin_percent=margin_percent,
-        ingredients=ings_db,
+        ingredients=payload.ingredients,
     )
 
 
+@app.post("/api/products", response_model=ProductOut)
+def create_product(payload: ProductIn):
+    cost = compute_cost(payload.ingredients)
+    if db is None:
+        return _product_out("temp", payload, cost)
+    try:
+        _id = create_document("product", _product_doc(payload, cost), _copy=False)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A product with this name already exists")
+    # Build the response from what we just wrote instead of reading it back
+    return _product_out(_id, payload, cost)
+
+
+# One request is one insert_many and one response held in memory
+MAX_BULK_PRODUCTS = 500
+
+
+@app.post("/api/products/bulk", response_model=List[ProductOut])
+def create_products_bulk(payload: List[ProductIn]):
+    # Checked here: FastAPI 0.104 doesn't enforce list length constraints on a
+    # top-level body (conlist is silently ignored)
+    if len(payload) > MAX_BULK_PRODUCTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {MAX_BULK_PRODUCTS} products per bulk request",
+        )
+    costs = [compute_cost(p.ingredients) for p in payload]
+    if db is None:
+        return [_product_out("temp", p, c) for p, c in zip(payload, costs)]
+    docs = [_product_doc(p, c) for p, c in zip(payload, costs)]
+    try:
+        ids = create_documents("product", docs, _copy=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if e.details.get("writeConcernErrors") or any(err.get("code") != 11000 for err in write_errors):
+            raise
+        # Unordered insert: everything except the duplicates was stored, so
+        # report what was created to keep client retries from colliding
+        failed = sorted(err["index"] for err in write_errors)
+        failed_set = set(failed)
+        created = [
+            _product_out(str(d["_id"]), p, c).model_dump()
+            for i, (d, p, c) in enumerate(zip(docs, payload, costs))
+            if i not in failed_set
+        ]
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": f"{len(failed)} of {len(docs)} products have names that already exist",
+                "failed_indexes": failed,
+                "created": created,
+            },
+        )
+    return [_product_out(_id, p, c) for _id, p, c in zip(ids, payload, costs)]
+
+
 @app.delete("/api/products/{product_id}")
 def delete_product(product_id: str):
     if db is None:
         return {"ok": True}
-    try:
-        db["product"].delete_one({"_id": ObjectId(product_id)})
-        return {"ok": True}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Reject malformed ids before making a round trip
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=400, detail="Invalid product id")
+    result = db["product"].delete_one({"_id": ObjectId(product_id)})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"ok": True}
+
+
+# Environment is fixed for the life of the process
+_DATABASE_URL_STATUS = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
+_DATABASE_NAME_STATUS = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+
+# /test doubles as a load-balancer health check; don't list collections on every probe
+COLLECTIONS_CACHE_TTL = 10.0
+_collections_cache = {"names": None, "ts": 0.0}
 
 
 @app.get("/test")
@@ -250,13 +460,17 @@ def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available" if db is None else "✅ Connected & Working",
-        "database_url": "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set",
-        "database_name": "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set",
+        "database_url": _DATABASE_URL_STATUS,
+        "database_name": _DATABASE_NAME_STATUS,
         "collections": []
     }
     try:
         if db is not None:
-            response["collections"] = db.list_collection_names()
+            now = time.monotonic()
+            if _collections_cache["names"] is None or now - _collections_cache["ts"] >= COLLECTIONS_CACHE_TTL:
+                _collections_cache["names"] = db.list_collection_names()
+                _collections_cache["ts"] = now
+            response["collections"] = _collections_cache["names"]
     except Exception as e:
         response["database"] = f"⚠️ Error: {str(e)[:80]}"
     return response
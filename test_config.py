@@ -0,0 +1,23 @@
+import pytest
+
+from config import env_float, env_int
+
+
+def test_unset_or_blank_uses_default(monkeypatch):
+    monkeypatch.delenv("X_SETTING", raising=False)
+    assert env_int("X_SETTING", 5) == 5
+    monkeypatch.setenv("X_SETTING", " ")
+    assert env_float("X_SETTING", 2.5) == 2.5
+
+
+def test_parses_values(monkeypatch):
+    monkeypatch.setenv("X_SETTING", "3")
+    assert env_int("X_SETTING", 5) == 3
+    assert env_float("X_SETTING", 5.0) == 3.0
+
+
+@pytest.mark.parametrize("raw", ["50x", "0"])
+def test_rejects_typos_and_values_below_minimum(monkeypatch, raw):
+    monkeypatch.setenv("X_SETTING", raw)
+    with pytest.raises(ValueError, match="X_SETTING"):
+        env_int("X_SETTING", 5, minimum=1)
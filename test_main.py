@@ -0,0 +1,80 @@
+import orjson
+from fastapi.testclient import TestClient
+
+import main
+from main import IngredientIn, ProductIn, ProductOut, ProductOutFast
+
+
+PAYLOAD = {
+    "name": "Latte 12oz",
+    "category": "Coffee",
+    "price": 4,
+    "ingredients": [
+        {"name": "Milk", "unit": "ml", "pack_size": 1000, "pack_cost": 1, "quantity": 220},
+        {"name": "Cup", "unit": "pc", "unit_cost": 0.12, "quantity": 1},
+    ],
+}
+
+
+def _validated(product_id: str) -> dict:
+    payload = ProductIn(**PAYLOAD)
+    cost = main.compute_cost(payload.ingredients)
+    margin_amount = payload.price - cost
+    return ProductOut(
+        id=product_id,
+        name=payload.name,
+        category=payload.category,
+        price=payload.price,
+        cost=cost,
+        margin_amount=margin_amount,
+        margin_percent=margin_amount / payload.price * 100,
+        ingredients=[ing.model_dump() for ing in payload.ingredients],
+    ).model_dump()
+
+
+def test_model_construct_matches_validated():
+    payload = ProductIn(**PAYLOAD)
+    fast = main._product_out("abc", payload, main.compute_cost(payload.ingredients))
+    assert orjson.loads(fast.model_dump_json()) == _validated("abc")
+
+
+def test_create_product_response_shape(monkeypatch):
+    monkeypatch.setattr(main, "db", None)
+    client = TestClient(main.app)
+    r = client.post("/api/products", json=PAYLOAD)
+    assert r.status_code == 200
+    assert r.json() == _validated("temp")
+    assert list(r.json()) == ["id", "name", "category", "price", "cost",
+                              "margin_amount", "margin_percent", "ingredients"]
+
+
+def test_ingredient_out_matches_ingredient_in():
+    # Legacy row: missing keys, int quantity and a stray field
+    stored = {"name": "x", "unit_cost": 0.5, "quantity": 2, "legacy": True}
+    assert main._ingredient_out(stored) == IngredientIn(**stored).model_dump()
+
+
+def test_product_out_fast_matches_product_out():
+    expected = _validated("abc")
+    fast = ProductOutFast(
+        id="abc",
+        name=PAYLOAD["name"],
+        category=PAYLOAD["category"],
+        price=expected["price"],
+        cost=expected["cost"],
+        margin_amount=expected["margin_amount"],
+        margin_percent=expected["margin_percent"],
+        ingredients=[main._ingredient_out(ing) for ing in PAYLOAD["ingredients"]],
+    )
+    assert orjson.loads(orjson.dumps(fast)) == expected
+
+
+def test_settings_etag_revalidation(monkeypatch):
+    monkeypatch.setattr(main, "db", None)
+    client = TestClient(main.app)
+    r = client.get("/api/settings")
+    etag = r.headers["etag"]
+    assert r.headers["cache-control"] == "no-cache"
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        assert client.get("/api/settings", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/api/settings", headers={"If-None-Match": '"other"'}).status_code == 200
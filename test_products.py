@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import BulkWriteError
+
+import main
+
+
+def _product(name, price=2.0):
+    return {"name": name, "price": price, "ingredients": []}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_bulk_partial_duplicates_report_created_and_failed(mongo, client):
+    mongo["product"].create_index([("name", 1)], unique=True)
+    client.post("/api/products", json=_product("Existing"))
+    r = client.post("/api/products/bulk", json=[_product("A"), _product("Existing"), _product("A")])
+    assert r.status_code == 409
+    detail = r.json()["detail"]
+    assert detail["failed_indexes"] == [1, 2]
+    assert [p["name"] for p in detail["created"]] == ["A"]
+    stored = mongo["product"].find_one({"name": "A"})
+    assert detail["created"][0]["id"] == str(stored["_id"])
+
+
+@pytest.mark.parametrize("details", [
+    {"writeErrors": [{"index": 0, "code": 121, "errmsg": "validation"}], "writeConcernErrors": []},
+    {"writeErrors": [], "writeConcernErrors": [{"code": 64, "errmsg": "timeout"}]},
+])
+def test_bulk_other_errors_are_not_conflicts(mongo, client, monkeypatch, details):
+    def fail(*args, **kwargs):
+        raise BulkWriteError(details)
+
+    monkeypatch.setattr(main, "create_documents", fail)
+    with pytest.raises(BulkWriteError):
+        client.post("/api/products/bulk", json=[_product("A")])
+
+
+def test_bulk_rejects_oversized_batches(mongo, client):
+    r = client.post("/api/products/bulk", json=[_product(str(i)) for i in range(main.MAX_BULK_PRODUCTS + 1)])
+    assert r.status_code == 422
+
+
+def test_delete_malformed_id_is_400_without_db_call(mongo, client, monkeypatch):
+    class _NoDB:
+        def __getitem__(self, name):
+            raise AssertionError("database should not be touched")
+
+    monkeypatch.setattr(main, "db", _NoDB())
+    assert client.delete("/api/products/not-an-id").status_code == 400
+
+
+def test_delete_missing_id_is_404(mongo, client):
+    assert client.delete("/api/products/0123456789abcdef01234567").status_code == 404
+
+
+def test_delete_existing_product(mongo, client):
+    product_id = client.post("/api/products", json=_product("A")).json()["id"]
+    r = client.delete(f"/api/products/{product_id}")
+    assert r.status_code == 200
+    assert r.json() == {"ok": True}
+    assert mongo["product"].count_documents({}) == 0
+
+
+def _python_margins(price, cost):
+    margin_amount = price - cost
+    return margin_amount, (margin_amount / price * 100) if price else 0
+
+
+@pytest.mark.parametrize("doc, cost", [
+    ({"name": "Stored", "price": 4.0, "cost": 1.5}, 1.5),
+    ({"name": "Free", "price": 0.0, "cost": 1.5}, 1.5),
+    ({"name": "No price", "cost": 1.5}, 1.5),
+    ({"name": "Legacy", "price": 3.0,
+      "ingredients": [{"name": "x", "unit_cost": 0.5, "quantity": 2}]}, 1.0),
+])
+def test_list_margins_match_python(mongo, client, doc, cost):
+    mongo["product"].insert_one(dict(doc))
+    [row] = client.get("/api/products").json()
+    price = doc.get("price", 0.0)
+    margin_amount, margin_percent = _python_margins(price, cost)
+    assert row["price"] == price
+    assert row["cost"] == pytest.approx(cost)
+    assert row["margin_amount"] == pytest.approx(margin_amount)
+    assert row["margin_percent"] == pytest.approx(margin_percent)
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _tax_rate(client):
+    return client.get("/api/settings").json()["tax_rate"]
+
+
+def test_ttl_hit_and_miss(mongo):
+    client = TestClient(main.app)
+    assert _tax_rate(client) == 0.1
+    mongo["settings"].update_one({}, {"$set": {"tax_rate": 0.3}})
+    # Within the TTL the cached value is served
+    assert _tax_rate(client) == 0.1
+    main._settings_cache["ts"] -= main.SETTINGS_CACHE_TTL + 1
+    assert _tax_rate(client) == 0.3
+
+
+def test_put_refreshes_cache(mongo):
+    client = TestClient(main.app)
+    assert _tax_rate(client) == 0.1
+    assert client.put("/api/settings", json={"tax_rate": 0.2}).json()["tax_rate"] == 0.2
+    # Served from the entry the PUT wrote, not from a re-read
+    mongo["settings"].update_one({}, {"$set": {"tax_rate": 0.9}})
+    assert _tax_rate(client) == 0.2
+
+
+class _RacingDB:
+    """Runs a PUT between a GET's find_one and its cache store"""
+
+    def __init__(self, mdb):
+        self._mdb = mdb
+        self.armed = True
+
+    def __getitem__(self, name):
+        col = self._mdb[name]
+        if name != "settings":
+            return col
+        db = self
+
+        class _Settings:
+            def __getattr__(self, attr):
+                return getattr(col, attr)
+
+            def find_one(self, *args, **kwargs):
+                doc = col.find_one(*args, **kwargs)
+                if db.armed:
+                    db.armed = False
+                    main.update_settings(main.SettingsIn(tax_rate=0.5))
+                return doc
+
+        return _Settings()
+
+
+def test_get_overlapping_put_does_not_cache_stale_value(mongo, monkeypatch):
+    mongo["settings"].insert_one({"_id": "global", "tax_rate": 0.1})
+    monkeypatch.setattr(main, "db", _RacingDB(mongo))
+    client = TestClient(main.app)
+    # The overlapping GET may answer with what it read...
+    assert _tax_rate(client) == 0.1
+    # ...but must not overwrite the PUT's cache entry
+    assert _tax_rate(client) == 0.5